@@ -3,22 +3,29 @@ Cosmos Auth Package - Azure Cosmos DB Authentication and User Verification
 """
 
 from .user_verifier import UserVerifier
+from .async_user_verifier import AsyncUserVerifier
 from .auth_decorators import (
     require_auth,
     get_current_user_fastapi,
     require_role_fastapi,
     get_current_user,
+    CosmosAuthASGIMiddleware,
+    get_current_user_asgi,
 )
-from .schemas import User, UserRole
+from .schemas import User, UserRole, CosmosAuthError
 
 __version__ = "1.0.0"
 __all__ = [
     "UserVerifier",
+    "AsyncUserVerifier",
     "require_auth",
     "get_current_user_fastapi",
     "require_role_fastapi",
     "get_current_user",
+    "CosmosAuthASGIMiddleware",
+    "get_current_user_asgi",
     "User",
     "UserRole",
+    "CosmosAuthError",
 ]
 
@@ -0,0 +1,520 @@
+"""
+Async user verification functions for Cosmos DB (azure.cosmos.aio)
+"""
+
+import asyncio
+from typing import Optional, Dict, List
+from azure.core import MatchConditions
+from azure.cosmos.aio import ContainerProxy
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+from .schemas import User, CosmosAuthError, _ITEM_PREFIX
+from .user_verifier import (
+    _MISSING,
+    _USERNAME_INDEX_PREFIX,
+    _USERNAME_QUERY,
+    _USERS_BY_ID_QUERY,
+    _USERS_BATCH_SIZE,
+    _TTLCache,
+    _profile_patch_operations,
+    _username_index_dict,
+)
+
+
+class AsyncUserVerifier:
+    """
+    Async user verification and management for Cosmos DB
+    
+    Mirrors UserVerifier on top of an ``azure.cosmos.aio`` container, so
+    lookups never block the event loop. Use it with FastAPI / other asyncio
+    frameworks; keep UserVerifier for Flask.
+    """
+    
+    __slots__ = (
+        "container",
+        "_read_item",
+        "_read_items",
+        "_query_items",
+        "_upsert_item",
+        "_create_item",
+        "_replace_item",
+        "_patch_item",
+        "_cache",
+        "_negative_cache",
+        "_negative_username_cache",
+        "_inflight",
+    )
+    
+    def __init__(
+        self,
+        user_container: ContainerProxy,
+        cache_size: int = 1024,
+        cache_ttl: float = 30.0,
+        negative_cache_ttl: float = 5.0,
+    ):
+        """
+        Initialize AsyncUserVerifier with an async Cosmos DB container
+        
+        Args:
+            user_container: azure.cosmos.aio ContainerProxy for users
+            cache_size: Maximum number of users kept in the in-process cache
+            cache_ttl: Seconds a cached user stays valid (0 disables caching)
+            negative_cache_ttl: Seconds an unknown user ID or username is
+                remembered as missing, so repeated lookups skip Cosmos DB
+                (0 disables)
+        """
+        if not user_container:
+            raise ValueError("user_container is required")
+        self.container = user_container
+        # Container methods bound once so hot paths skip the attribute walk
+        self._read_item = user_container.read_item
+        # Batched point reads; None on azure-cosmos releases without them
+        self._read_items = getattr(user_container, "read_items", None)
+        self._query_items = user_container.query_items
+        self._upsert_item = user_container.upsert_item
+        self._create_item = user_container.create_item
+        self._replace_item = user_container.replace_item
+        self._patch_item = user_container.patch_item
+        # The caches never await while holding their lock, so the same
+        # thread-safe cache as UserVerifier is used (no asyncio.Lock needed)
+        self._cache = _TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._negative_cache = _TTLCache(maxsize=cache_size, ttl=negative_cache_ttl)
+        self._negative_username_cache = _TTLCache(maxsize=cache_size, ttl=negative_cache_ttl)
+        self._inflight: Dict[str, "asyncio.Task[Optional[User]]"] = {}
+    
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """
+        Drop a user from the in-process cache
+        
+        Args:
+            user_id: User ID to evict; evicts every cached user when omitted
+        """
+        if user_id is None:
+            self._cache.clear()
+            self._negative_cache.clear()
+            self._negative_username_cache.clear()
+        else:
+            self._cache.pop(user_id)
+            self._negative_cache.pop(user_id)
+    
+    async def warmup(self) -> None:
+        """
+        Open connections and load container metadata ahead of the first request
+        
+        See UserVerifier.warmup.
+        """
+        try:
+            await self.container.read_item(
+                item=_ITEM_PREFIX + "__warmup__",
+                partition_key="__warmup__"
+            )
+        except CosmosResourceNotFoundError:
+            pass
+    
+    async def verify_user_exists(self, user_id: str) -> bool:
+        """
+        Verify if user exists in Cosmos DB
+        
+        Args:
+            user_id: User ID (email or username)
+        
+        Returns:
+            True if user exists, False otherwise
+        """
+        try:
+            user = await self.get_user(user_id)
+            return user is not None
+        except CosmosAuthError:
+            return False
+    
+    async def get_user(self, user_id: str) -> Optional[User]:
+        """
+        Get user from Cosmos DB by user_id (email or username)
+        
+        Args:
+            user_id: User ID (email or username)
+        
+        Returns:
+            User object if found, None otherwise
+        """
+        user = self._cache.get(user_id)
+        if user is not _MISSING:
+            return user
+        if self._negative_cache.get(user_id) is not _MISSING:
+            return None
+        
+        # Single-flight: concurrent misses for the same user await one read.
+        # The read runs in its own task and every caller awaits it shielded,
+        # so cancelling any caller (the first one included) leaves the read
+        # running for the others.
+        flight = self._inflight.get(user_id)
+        if flight is None:
+            flight = self._inflight[user_id] = asyncio.ensure_future(self._read_user(user_id))
+            
+            def _land(task: "asyncio.Task[Optional[User]]") -> None:
+                del self._inflight[user_id]
+                if not task.cancelled():
+                    # Mark retrieved: every caller may have been cancelled
+                    task.exception()
+            
+            flight.add_done_callback(_land)
+        return await asyncio.shield(flight)
+    
+    async def _read_user(self, user_id: str) -> Optional[User]:
+        """Point-read a user from Cosmos DB and record the result in the caches"""
+        token = self._cache.snapshot()
+        negative_token = self._negative_cache.snapshot()
+        try:
+            item_id = _ITEM_PREFIX + user_id
+            item = await self._read_item(
+                item=item_id,
+                partition_key=user_id
+            )
+            
+            user = User.from_dict(item)
+            self._cache.fill(user_id, user, token)
+            return user
+        except CosmosResourceNotFoundError:
+            self._negative_cache.fill(user_id, None, negative_token)
+            return None
+        except Exception as e:
+            raise CosmosAuthError("Error getting user") from e
+    
+    async def get_users(self, user_ids: List[str]) -> Dict[str, User]:
+        """
+        Get several users from Cosmos DB with batched point reads
+        
+        See UserVerifier.get_users.
+        
+        Args:
+            user_ids: User IDs (emails) to look up
+        
+        Returns:
+            Dictionary of user_id -> User for every user that was found
+        """
+        users: Dict[str, User] = {}
+        missing: List[str] = []
+        for user_id in dict.fromkeys(user_ids):
+            user = self._cache.get(user_id)
+            if user is not _MISSING:
+                users[user_id] = user
+            elif self._negative_cache.get(user_id) is _MISSING:
+                missing.append(user_id)
+        
+        if not missing:
+            return users
+        
+        token = self._cache.snapshot()
+        negative_token = self._negative_cache.snapshot()
+        read_items = self._read_items
+        for start in range(0, len(missing), _USERS_BATCH_SIZE):
+            chunk = missing[start:start + _USERS_BATCH_SIZE]
+            if read_items is not None:
+                for item in await read_items(
+                    items=[(_ITEM_PREFIX + user_id, user_id) for user_id in chunk]
+                ):
+                    user = User.from_dict(item)
+                    self._cache.fill(user.user_id, user, token)
+                    users[user.user_id] = user
+                continue
+            
+            # azure-cosmos releases without read_items: one query per chunk
+            items = self._query_items(
+                query=_USERS_BY_ID_QUERY,
+                parameters=[{"name": "@ids", "value": chunk}]
+            )
+            async for item in items:
+                user = User.from_dict(item)
+                self._cache.fill(user.user_id, user, token)
+                users[user.user_id] = user
+        for user_id in missing:
+            if user_id not in users:
+                self._negative_cache.fill(user_id, None, negative_token)
+        
+        return users
+    
+    async def get_user_by_email(self, email: str) -> Optional[User]:
+        """
+        Get user by email address
+        
+        Args:
+            email: User email address
+        
+        Returns:
+            User object if found, None otherwise
+        """
+        return await self.get_user(email)
+    
+    async def get_user_by_username(self, username: str) -> Optional[User]:
+        """
+        Get user by username
+        
+        Args:
+            username: Username
+        
+        Returns:
+            User object if found, None otherwise
+        """
+        if self._negative_username_cache.get(username) is not _MISSING:
+            return None
+        token = self._negative_username_cache.snapshot()
+        
+        try:
+            index = await self._read_item(
+                item=_USERNAME_INDEX_PREFIX + username,
+                partition_key=username
+            )
+        except CosmosResourceNotFoundError:
+            user = await self._query_user_by_username(username)
+        else:
+            user = await self.get_user(index["target_user_id"])
+            if user is not None and user.username != username:
+                # Stale index entry left behind by a username change
+                user = None
+        
+        if user is None:
+            self._negative_username_cache.fill(username, None, token)
+        return user
+    
+    async def _query_user_by_username(self, username: str) -> Optional[User]:
+        """Legacy query fallback; see UserVerifier._query_user_by_username"""
+        parameters = [{"name": "@username", "value": username}]
+        token = self._cache.snapshot()
+        
+        items = self._query_items(
+            query=_USERNAME_QUERY,
+            parameters=parameters,
+            max_item_count=1
+        )
+        
+        async for item in items:
+            user = User.from_dict(item)
+            await self._claim_username(user.username, user.user_id)
+            self._negative_cache.pop(user.user_id)
+            self._cache.fill(user.user_id, user, token)
+            return user
+        
+        return None
+    
+    async def _claim_username(self, username: str, user_id: str) -> bool:
+        """
+        Point the username index document at user_id unless another user owns it
+        
+        See UserVerifier._claim_username.
+        """
+        self._negative_username_cache.pop(username)
+        index_id = _USERNAME_INDEX_PREFIX + username
+        try:
+            await self._create_item(_username_index_dict(username, user_id))
+            return True
+        except CosmosResourceExistsError:
+            pass
+        
+        try:
+            index = await self._read_item(item=index_id, partition_key=username)
+        except CosmosResourceNotFoundError:
+            return False
+        owner_id = index["target_user_id"]
+        if owner_id == user_id:
+            return True
+        owner = await self._read_user(owner_id)
+        if owner is not None and owner.username == username:
+            return False
+        
+        try:
+            await self._replace_item(
+                item=index_id,
+                body=_username_index_dict(username, user_id),
+                etag=index["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return True
+        except CosmosAccessConditionFailedError:
+            return False
+    
+    async def _release_username(self, username: str, user_id: str) -> None:
+        """
+        Delete the username index document if it still points at user_id
+        
+        See UserVerifier._release_username.
+        """
+        index_id = _USERNAME_INDEX_PREFIX + username
+        try:
+            index = await self._read_item(item=index_id, partition_key=username)
+        except CosmosResourceNotFoundError:
+            return
+        if index.get("target_user_id") != user_id:
+            return
+        try:
+            await self.container.delete_item(
+                item=index_id,
+                partition_key=username,
+                etag=index["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+        except (CosmosResourceNotFoundError, CosmosAccessConditionFailedError):
+            pass
+    
+    async def create_user(
+        self,
+        email: str,
+        username: Optional[str] = None,
+        role: Optional[str] = None,
+        display_name: Optional[str] = None,
+        **kwargs
+    ) -> User:
+        """
+        Create a new user in Cosmos DB
+        
+        See UserVerifier.create_user for how username collisions are handled.
+        
+        Args:
+            email: User email (used as user_id)
+            username: Username (defaults to email prefix)
+            role: User role (defaults to 'user')
+            display_name: Display name (defaults to username)
+            **kwargs: Additional user fields
+        
+        Returns:
+            Created User object
+        
+        Raises:
+            ValueError: If username is already taken by another user
+        """
+        user = User(
+            user_id=email,
+            email=email,
+            username=username,
+            role=role,
+            display_name=display_name,
+            **kwargs
+        )
+        
+        if not await self._claim_username(user.username, email) and username is not None:
+            raise ValueError(f"Username '{username}' is already taken")
+        
+        await self._upsert_item(user.to_dict())
+        self._negative_cache.pop(email)
+        self._cache.set(email, user)
+        
+        return user
+    
+    async def get_or_create_user(
+        self,
+        email: str,
+        username: Optional[str] = None,
+        role: Optional[str] = None,
+        display_name: Optional[str] = None,
+    ) -> User:
+        """
+        Get user if exists, otherwise create new user
+        
+        Args:
+            email: User email
+            username: Username
+            role: User role
+            display_name: Display name
+        
+        Returns:
+            User object (existing or newly created)
+        """
+        user = await self.get_user_by_email(email)
+        if user:
+            return user
+        
+        return await self.create_user(
+            email=email,
+            username=username,
+            role=role,
+            display_name=display_name
+        )
+    
+    async def verify_user_role(self, user_id: str, required_roles: List[str]) -> bool:
+        """
+        Verify if user has one of the required roles
+        
+        Args:
+            user_id: User ID
+            required_roles: List of required roles
+        
+        Returns:
+            True if user has required role, False otherwise
+        """
+        user = await self.get_user(user_id)
+        if not user:
+            return False
+        
+        return user.role in required_roles
+    
+    async def update_user_role(self, user_id: str, new_role: str) -> bool:
+        """
+        Update user role
+        
+        Args:
+            user_id: User ID
+            new_role: New role
+        
+        Returns:
+            True if updated successfully
+        """
+        return await self.update_user_profile(user_id, role=new_role)
+    
+    async def update_user_profile(
+        self,
+        user_id: str,
+        *,
+        role: Optional[str] = None,
+        display_name: Optional[str] = None,
+        username: Optional[str] = None,
+    ) -> bool:
+        """
+        Update several user fields in a single atomic patch
+        
+        See UserVerifier.update_user_profile.
+        
+        Args:
+            user_id: User ID
+            role: New role
+            display_name: New display name
+            username: New username (must not belong to another user)
+        
+        Returns:
+            True if updated successfully
+        """
+        patch_operations = _profile_patch_operations(role, display_name, username)
+        if not patch_operations:
+            return True
+        
+        try:
+            old_username = None
+            if username is not None:
+                current = await self._read_user(user_id)
+                if current is None:
+                    return False
+                if current.username != username:
+                    if not await self._claim_username(username, user_id):
+                        return False
+                    old_username = current.username
+            
+            item_id = _ITEM_PREFIX + user_id
+            item = await self._patch_item(
+                item=item_id,
+                partition_key=user_id,
+                patch_operations=patch_operations
+            )
+            self._negative_cache.pop(user_id)
+            self._cache.set(user_id, User.from_dict(item))
+        except Exception:
+            self.invalidate(user_id)
+            return False
+        
+        if old_username:
+            try:
+                await self._release_username(old_username, user_id)
+            except Exception:
+                # Left behind, it is harmless: lookups reject stale entries
+                pass
+        return True
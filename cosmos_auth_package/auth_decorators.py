@@ -2,10 +2,13 @@
 Authentication decorators and middleware for Flask and FastAPI
 """
 
-from typing import Optional, List, Callable
+import itertools
+import linecache
+from typing import Optional, List, Callable, FrozenSet, Union
 from functools import wraps
 from .user_verifier import UserVerifier
-from .schemas import User
+from .async_user_verifier import AsyncUserVerifier
+from .schemas import User, CosmosAuthError
 
 
 # Flask Support
@@ -18,12 +21,62 @@ except ImportError:
 
 # FastAPI Support
 try:
-    from fastapi import HTTPException, Header, Depends, status
+    from fastapi import HTTPException, Header, Depends, Request, status
     FASTAPI_AVAILABLE = True
 except ImportError:
     FASTAPI_AVAILABLE = False
 
 
+# Raw ASGI header names (always lower-case on the wire) and the bearer
+# prefix, encoded once at import for byte-equality checks per request
+_H_EMAIL = b"x-user-email"
+_H_UID = b"x-user-id"
+_H_AUTH = b"authorization"
+_BEARER = b"Bearer "
+
+
+def _role_set(required_roles: Optional[List[str]]) -> Optional[FrozenSet[str]]:
+    """Normalize required roles (strings or UserRole members) into a frozenset"""
+    if not required_roles:
+        return None
+    return frozenset(getattr(role, "value", role) for role in required_roles)
+
+
+async def _resolve_user(
+    verifier: Union[UserVerifier, AsyncUserVerifier],
+    is_async: bool,
+    user_identifier: str,
+    auto_create: bool
+) -> Optional[User]:
+    """
+    Get (and optionally create) a user through either verifier flavour
+    
+    Shared by the FastAPI dependencies: a failed Cosmos DB lookup becomes a
+    503 rather than escaping as a 500.
+    """
+    try:
+        if is_async:
+            user = await verifier.get_user(user_identifier)
+            if not user and auto_create:
+                user = await verifier.create_user(
+                    email=user_identifier,
+                    display_name=user_identifier
+                )
+        else:
+            user = verifier.get_user(user_identifier)
+            if not user and auto_create:
+                user = verifier.create_user(
+                    email=user_identifier,
+                    display_name=user_identifier
+                )
+    except CosmosAuthError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Service Unavailable - User lookup failed",
+        )
+    return user
+
+
 def require_auth(
     verifier: UserVerifier,
     required_roles: Optional[List[str]] = None,
@@ -49,51 +102,99 @@ def require_auth(
     if not FLASK_AVAILABLE:
         raise ImportError("Flask is required for Flask decorators")
     
+    # Resolved once per decorated route rather than on every request
+    roles = _role_set(required_roles)
+    
     def decorator(f: Callable) -> Callable:
-        @wraps(f)
-        def wrapper(*args, **kwargs):
-            user_identifier = request.headers.get(header_name)
-            
-            if not user_identifier:
-                # Try alternative headers
-                user_identifier = request.headers.get("x-user-id") or request.headers.get("Authorization")
-                if user_identifier and user_identifier.startswith("Bearer "):
-                    # Extract from token if needed (basic support)
-                    user_identifier = user_identifier[7:]
-            
-            if not user_identifier:
-                return jsonify({"error": "Unauthorized - Missing user identifier"}), 401
-            
-            # Get user from Cosmos DB
-            user = verifier.get_user(user_identifier)
-            
-            if not user:
-                if auto_create:
-                    user = verifier.create_user(
-                        email=user_identifier,
-                        display_name=user_identifier
-                    )
-                else:
-                    return jsonify({"error": "Unauthorized - User not found"}), 401
-            
-            # Check role if required
-            if required_roles:
-                if user.role not in required_roles:
-                    return jsonify({"error": "Forbidden - Insufficient permissions"}), 403
-            
-            # Attach user to request context
-            g.current_user = user
-            g.user_id = user.user_id
-            g.user_email = user.email
-            g.user_role = user.role
-            
-            return f(*args, **kwargs)
-        return wrapper
+        wrapper = _build_flask_wrapper(f, verifier, roles, header_name, auto_create)
+        return wraps(f)(wrapper)
     return decorator
 
 
-def get_current_user_fastapi(
+# Numbers each generated wrapper so every one gets its own linecache entry
+_wrapper_ids = itertools.count()
+
+
+def _build_flask_wrapper(
+    f: Callable,
     verifier: UserVerifier,
+    roles: Optional[FrozenSet[str]],
+    header_name: str,
+    auto_create: bool
+) -> Callable:
+    """
+    Generate the require_auth wrapper specialized for one set of arguments
+    
+    Options fixed at decoration time (role check, auto-create, redundant
+    header fallbacks) are decided here, so the generated function carries
+    no per-request branches for them. Only booleans shape the source text;
+    every value reaches the wrapper through its namespace, never by
+    interpolation.
+    """
+    fallbacks = [
+        name for name in ("x-user-id", "Authorization")
+        if name.lower() != header_name.lower()
+    ]
+    lines = [
+        "def wrapper(*args, **kwargs):",
+        "    get_header = request.headers.get",
+        "    user_identifier = (",
+        "        get_header(header_name)",
+    ]
+    lines += [f"        or get_header({name!r})" for name in fallbacks]
+    lines += [
+        "    )",
+        # Slice compare rather than startswith(): no method lookup/call
+        '    if user_identifier and user_identifier[:7] == "Bearer ":',
+        "        user_identifier = user_identifier[7:]",
+        "    if not user_identifier:",
+        '        return jsonify({"error": "Unauthorized - Missing user identifier"}), 401',
+        "    user = verifier.get_user(user_identifier)",
+        "    if not user:",
+    ]
+    if auto_create:
+        lines += [
+            "        user = verifier.create_user(",
+            "            email=user_identifier,",
+            "            display_name=user_identifier",
+            "        )",
+        ]
+    else:
+        lines.append('        return jsonify({"error": "Unauthorized - User not found"}), 401')
+    if roles is not None:
+        lines += [
+            "    if user.role not in roles:",
+            '        return jsonify({"error": "Forbidden - Insufficient permissions"}), 403',
+        ]
+    lines += [
+        "    g.current_user = user",
+        "    g.user_id = user.user_id",
+        "    g.user_email = user.email",
+        "    g.user_role = user.role",
+        "    return f(*args, **kwargs)",
+    ]
+    
+    namespace = {
+        "request": request,
+        "jsonify": jsonify,
+        "g": g,
+        "verifier": verifier,
+        "roles": roles,
+        "header_name": header_name,
+        "f": f,
+    }
+    source = "\n".join(lines) + "\n"
+    filename = f"<require_auth {getattr(f, '__qualname__', f)} #{next(_wrapper_ids)}>"
+    code = compile(source, filename, "exec")
+    # Register the generated source so tracebacks through the wrapper show
+    # its lines; mtime None keeps linecache.checkcache from evicting it
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    exec(code, namespace)
+    return namespace["wrapper"]
+
+
+def get_current_user_fastapi(
+    verifier: Union[UserVerifier, AsyncUserVerifier],
     header_name: str = "x-user-email",
     auto_create: bool = False
 ):
@@ -101,7 +202,8 @@ def get_current_user_fastapi(
     FastAPI dependency for getting current authenticated user
     
     Args:
-        verifier: UserVerifier instance
+        verifier: UserVerifier or AsyncUserVerifier instance (the async one
+            keeps Cosmos DB reads off the event loop)
         header_name: Header name to check (default: 'x-user-email')
         auto_create: Auto-create user if doesn't exist (default: False)
     
@@ -113,6 +215,8 @@ def get_current_user_fastapi(
     if not FASTAPI_AVAILABLE:
         raise ImportError("FastAPI is required for FastAPI dependencies")
     
+    is_async = isinstance(verifier, AsyncUserVerifier)
+    
     async def _get_current_user(
         user_header: Optional[str] = Header(None, alias=header_name),
         user_id_header: Optional[str] = Header(None, alias="x-user-id"),
@@ -127,20 +231,14 @@ def get_current_user_fastapi(
             )
         
         # Get user from Cosmos DB
-        user = verifier.get_user(user_identifier)
+        user = await _resolve_user(verifier, is_async, user_identifier, auto_create)
         
         if not user:
-            if auto_create:
-                user = verifier.create_user(
-                    email=user_identifier,
-                    display_name=user_identifier
-                )
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Unauthorized - User not found",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Unauthorized - User not found",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
         
         return user
     
@@ -148,7 +246,7 @@ def get_current_user_fastapi(
 
 
 def require_role_fastapi(
-    verifier: UserVerifier,
+    verifier: Union[UserVerifier, AsyncUserVerifier],
     required_roles: List[str],
     header_name: str = "x-user-email",
     auto_create: bool = False
@@ -157,7 +255,7 @@ def require_role_fastapi(
     FastAPI dependency with role checking
     
     Args:
-        verifier: UserVerifier instance
+        verifier: UserVerifier or AsyncUserVerifier instance
         required_roles: List of required roles
         header_name: Header name to check
         auto_create: Auto-create user if doesn't exist
@@ -172,10 +270,13 @@ def require_role_fastapi(
     if not FASTAPI_AVAILABLE:
         raise ImportError("FastAPI is required for FastAPI dependencies")
     
+    # Frozen copy: O(1) lookups and immune to later mutation by the caller
+    roles = _role_set(required_roles) or frozenset()
+    
     async def _require_role(
         current_user: User = Depends(get_current_user_fastapi(verifier, header_name, auto_create))
     ) -> User:
-        if current_user.role not in required_roles:
+        if current_user.role not in roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Forbidden - Insufficient permissions",
@@ -185,6 +286,142 @@ def require_role_fastapi(
     return _require_role
 
 
+class CosmosAuthASGIMiddleware:
+    """
+    Pure ASGI middleware that extracts the user identifier once per request
+    
+    Reads the identifier straight from the raw ``scope["headers"]`` byte pairs
+    (no Request object, header parsing or dependency resolution) and stores
+    it, with the verifier, in the request state. Nothing is looked up here:
+    ``get_current_user_asgi`` resolves the user on first use, so public
+    routes never touch Cosmos DB and a Cosmos DB outage cannot fail them.
+    
+    Args:
+        app: ASGI application to wrap
+        verifier: UserVerifier or AsyncUserVerifier instance
+        header_name: Header name to check (default: 'x-user-email'); falls
+            back to 'x-user-id', then 'Authorization' (Bearer prefix stripped)
+    
+    Usage:
+        app = FastAPI()
+        app.add_middleware(CosmosAuthASGIMiddleware, verifier=verifier)
+        
+        @app.get("/protected")
+        async def protected_route(current_user: User = Depends(get_current_user_asgi())):
+            return {"message": f"Hello {current_user.email}"}
+    """
+    
+    def __init__(
+        self,
+        app,
+        verifier: Union[UserVerifier, AsyncUserVerifier],
+        header_name: Union[str, bytes] = _H_EMAIL
+    ):
+        if isinstance(header_name, str):
+            header_name = header_name.encode("latin-1")
+        self.app = app
+        self.verifier = verifier
+        # ASGI servers always deliver header names lower-cased
+        self.header_name = header_name.lower()
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        
+        # One pass over the raw (name, value) byte pairs; nothing is decoded
+        # until the identifier has been picked
+        header_name = self.header_name
+        primary = user_id_value = auth_value = None
+        for key, value in scope["headers"]:
+            if key == header_name:
+                # An empty value counts as missing, as in the Flask wrapper
+                if value:
+                    primary = value
+                    break
+                continue
+            if key == _H_UID:
+                if user_id_value is None:
+                    user_id_value = value
+            elif key == _H_AUTH:
+                if auth_value is None:
+                    auth_value = value
+        
+        raw_identifier = primary or user_id_value or auth_value
+        if raw_identifier and raw_identifier[:7] == _BEARER:
+            raw_identifier = raw_identifier[7:]
+        
+        state = scope.setdefault("state", {})
+        state["user_identifier"] = raw_identifier.decode("latin-1") if raw_identifier else None
+        state["user_verifier"] = self.verifier
+        await self.app(scope, receive, send)
+
+
+def get_current_user_asgi(
+    required_roles: Optional[List[str]] = None,
+    auto_create: bool = False
+):
+    """
+    FastAPI dependency resolving the user identified by CosmosAuthASGIMiddleware
+    
+    Drop-in replacement for ``get_current_user_fastapi`` /
+    ``require_role_fastapi`` once the middleware is installed. The user is
+    looked up on first use and kept in ``request.state.current_user`` for
+    the rest of the request.
+    
+    Args:
+        required_roles: Optional list of required roles
+        auto_create: Auto-create user if doesn't exist (default: False)
+    
+    Usage:
+        @app.get("/admin")
+        async def admin_route(
+            current_user: User = Depends(get_current_user_asgi(['admin']))
+        ):
+            return {"message": "Admin access"}
+    """
+    if not FASTAPI_AVAILABLE:
+        raise ImportError("FastAPI is required for FastAPI dependencies")
+    
+    roles = _role_set(required_roles)
+    
+    async def _get_current_user(request: Request) -> User:
+        state = request.state
+        user = getattr(state, "current_user", None)
+        if user is None:
+            verifier = getattr(state, "user_verifier", None)
+            if verifier is None:
+                raise RuntimeError("CosmosAuthASGIMiddleware is not installed")
+            user_identifier = state.user_identifier
+            if not user_identifier:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Unauthorized - Missing user identifier",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            user = await _resolve_user(
+                verifier,
+                isinstance(verifier, AsyncUserVerifier),
+                user_identifier,
+                auto_create
+            )
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Unauthorized - User not found",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            state.current_user = user
+        if roles is not None and user.role not in roles:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Forbidden - Insufficient permissions",
+            )
+        return user
+    
+    return _get_current_user
+
+
 # Alias for convenience
 get_current_user = get_current_user_fastapi
 
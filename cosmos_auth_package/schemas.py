@@ -2,10 +2,14 @@
 User schemas and models for Cosmos Auth Package
 """
 
-from typing import Optional, List
+from typing import Optional, List, Any, Mapping
 from enum import Enum
 
 
+class CosmosAuthError(Exception):
+    """Raised when a Cosmos DB operation fails for a reason other than not-found"""
+
+
 class UserRole(str, Enum):
     """User role enumeration"""
     USER = "user"
@@ -14,9 +18,32 @@ class UserRole(str, Enum):
     VIEWER = "viewer"
 
 
+# Resolved once instead of walking the enum on every User construction
+_DEFAULT_ROLE = UserRole.USER.value
+
+# Cosmos DB item id prefix for user documents ("user_" + user_id)
+_ITEM_PREFIX = "user_"
+
+
 class User:
     """User model for Cosmos DB"""
     
+    # Fixed attribute layout: no per-instance __dict__, which keeps cached
+    # users small and attribute access fast
+    __slots__ = (
+        "id",
+        "type",
+        "user_id",
+        "email",
+        "username",
+        "role",
+        "display_name",
+        "is_active",
+        "agents",
+        "created_at",
+        "updated_at",
+    )
+    
     def __init__(
         self,
         user_id: str,
@@ -25,19 +52,22 @@ class User:
         role: Optional[str] = None,
         display_name: Optional[str] = None,
         is_active: bool = True,
+        agents: Optional[List[str]] = None,
+        created_at: Optional[str] = None,
+        updated_at: Optional[str] = None,
         **kwargs
     ):
-        self.id = f"user_{user_id}"
+        self.id = _ITEM_PREFIX + user_id
         self.type = "user"
         self.user_id = user_id
         self.email = email
         self.username = username or email.split("@")[0]
-        self.role = role or UserRole.USER.value
+        self.role = role or _DEFAULT_ROLE
         self.display_name = display_name or username or email
         self.is_active = is_active
-        self.agents = kwargs.get("agents", [])
-        self.created_at = kwargs.get("created_at")
-        self.updated_at = kwargs.get("updated_at")
+        self.agents = agents if agents is not None else []
+        self.created_at = created_at
+        self.updated_at = updated_at
     
     def to_dict(self) -> dict:
         """Convert user to dictionary for Cosmos DB"""
@@ -56,17 +86,18 @@ class User:
         }
     
     @classmethod
-    def from_dict(cls, data: dict) -> "User":
-        """Create user from Cosmos DB dictionary"""
+    def from_dict(cls, data: Mapping[str, Any]) -> "User":
+        """Create user from a Cosmos DB item (dict or CosmosDict, no copy needed)"""
+        # Bound once and passed positionally: this runs on every Cosmos read
+        get = data.get
         return cls(
-            user_id=data.get("user_id", ""),
-            email=data.get("email", ""),
-            username=data.get("username"),
-            role=data.get("role"),
-            display_name=data.get("display_name"),
-            is_active=data.get("is_active", True),
-            agents=data.get("agents", []),
-            created_at=data.get("created_at"),
-            updated_at=data.get("updated_at"),
+            get("user_id") or "",
+            get("email", ""),
+            get("username"),
+            get("role"),
+            get("display_name"),
+            get("is_active", True),
+            get("agents"),
+            get("created_at"),
+            get("updated_at"),
         )
-
@@ -2,26 +2,241 @@
 User verification functions for Cosmos DB
 """
 
-from typing import Optional, Dict, List
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List, Any, Tuple
+from azure.core import MatchConditions
 from azure.cosmos import ContainerProxy
-from azure.cosmos.exceptions import CosmosResourceNotFoundError
-from azure.cosmos import CosmosDict
-from .schemas import User, UserRole
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+from .schemas import User, UserRole, CosmosAuthError, _ITEM_PREFIX
+
+
+_MISSING = object()
+
+# Cosmos DB item id prefix for username index documents
+_USERNAME_INDEX_PREFIX = "username_"
+
+# Kept byte-for-byte identical across calls so the gateway's query plan
+# cache (keyed on the query text) is reused
+_USERNAME_QUERY = "SELECT TOP 1 * FROM c WHERE c.username = @username AND c.type = 'user'"
+
+# get_users fetches at most _USERS_BATCH_SIZE IDs per read_items call, or
+# per query on azure-cosmos releases without read_items
+_USERS_BY_ID_QUERY = "SELECT * FROM c WHERE c.type = 'user' AND ARRAY_CONTAINS(@ids, c.user_id)"
+_USERS_BATCH_SIZE = 100
+
+
+def _username_index_dict(username: str, user_id: str) -> dict:
+    """Build the username index document pointing at a user's item"""
+    # user_id carries the partition key (the username) like every other
+    # document in the container; the owning user is in target_user_id
+    return {
+        "id": _USERNAME_INDEX_PREFIX + username,
+        "type": "username_index",
+        "user_id": username,
+        "username": username,
+        "target_user_id": user_id,
+    }
+
+
+def _profile_patch_operations(
+    role: Optional[str],
+    display_name: Optional[str],
+    username: Optional[str],
+) -> List[dict]:
+    """Build the patch operations for update_user_profile"""
+    patch_operations = []
+    if role is not None:
+        patch_operations.append({'op': 'set', 'path': '/role', 'value': role})
+    if display_name is not None:
+        patch_operations.append({'op': 'set', 'path': '/display_name', 'value': display_name})
+    if username is not None:
+        patch_operations.append({'op': 'set', 'path': '/username', 'value': username})
+    return patch_operations
+
+
+class _TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after a fixed TTL
+    
+    Every write (set/pop/clear) advances a clock and stamps the key. A
+    Cosmos DB read takes a snapshot() before it starts and stores its
+    result with fill(), which is skipped if the key was written in the
+    meantime, so a slow read can never overwrite a newer write-through
+    entry or resurrect an invalidated one.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._clock = 0
+        # key -> clock of its last write, trimmed like the data itself;
+        # _written_floor is the newest stamp forgotten by that trimming
+        self._written: "OrderedDict[str, int]" = OrderedDict()
+        self._written_floor = 0
+    
+    def get(self, key: str, default: Any = _MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+    
+    def snapshot(self) -> int:
+        """Token for fill(): the write clock before a read starts"""
+        with self._lock:
+            return self._clock
+    
+    def set(self, key: str, value: Any) -> None:
+        """Write-through: store a value known to be current"""
+        with self._lock:
+            self._stamp(key)
+            self._store(key, value)
+    
+    def fill(self, key: str, value: Any, token: int) -> None:
+        """Store a read result unless the key was written after snapshot()"""
+        with self._lock:
+            if self._written_floor > token or self._written.get(key, 0) > token:
+                return
+            self._store(key, value)
+    
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._stamp(key)
+            self._data.pop(key, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._clock += 1
+            self._data.clear()
+            self._written.clear()
+            self._written_floor = self._clock
+    
+    def _stamp(self, key: str) -> None:
+        self._clock += 1
+        self._written[key] = self._clock
+        self._written.move_to_end(key)
+        while len(self._written) > max(self.maxsize, 1):
+            self._written_floor = self._written.popitem(last=False)[1]
+    
+    def _store(self, key: str, value: Any) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class _Flight:
+    """A Cosmos DB read in progress that concurrent callers can wait on"""
+    
+    __slots__ = ("event", "result", "error")
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[User] = None
+        self.error: Optional[BaseException] = None
 
 
 class UserVerifier:
     """User verification and management for Cosmos DB"""
     
-    def __init__(self, user_container: ContainerProxy):
+    __slots__ = (
+        "container",
+        "_read_item",
+        "_read_items",
+        "_query_items",
+        "_upsert_item",
+        "_create_item",
+        "_replace_item",
+        "_patch_item",
+        "_cache",
+        "_negative_cache",
+        "_negative_username_cache",
+        "_inflight",
+        "_inflight_lock",
+    )
+    
+    def __init__(
+        self,
+        user_container: ContainerProxy,
+        cache_size: int = 1024,
+        cache_ttl: float = 30.0,
+        negative_cache_ttl: float = 5.0,
+    ):
         """
         Initialize UserVerifier with Cosmos DB container
         
         Args:
             user_container: Azure Cosmos DB ContainerProxy for users
+            cache_size: Maximum number of users kept in the in-process cache
+            cache_ttl: Seconds a cached user stays valid (0 disables caching)
+            negative_cache_ttl: Seconds an unknown user ID or username is
+                remembered as missing, so repeated lookups skip Cosmos DB
+                (0 disables)
         """
         if not user_container:
             raise ValueError("user_container is required")
         self.container = user_container
+        # Container methods bound once so hot paths skip the attribute walk
+        self._read_item = user_container.read_item
+        # Batched point reads; None on azure-cosmos releases without them
+        self._read_items = getattr(user_container, "read_items", None)
+        self._query_items = user_container.query_items
+        self._upsert_item = user_container.upsert_item
+        self._create_item = user_container.create_item
+        self._replace_item = user_container.replace_item
+        self._patch_item = user_container.patch_item
+        self._cache = _TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._negative_cache = _TTLCache(maxsize=cache_size, ttl=negative_cache_ttl)
+        self._negative_username_cache = _TTLCache(maxsize=cache_size, ttl=negative_cache_ttl)
+        self._inflight: Dict[str, _Flight] = {}
+        self._inflight_lock = threading.Lock()
+    
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """
+        Drop a user from the in-process cache
+        
+        Args:
+            user_id: User ID to evict; evicts every cached user when omitted
+        """
+        if user_id is None:
+            self._cache.clear()
+            self._negative_cache.clear()
+            self._negative_username_cache.clear()
+        else:
+            self._cache.pop(user_id)
+            self._negative_cache.pop(user_id)
+    
+    def warmup(self) -> None:
+        """
+        Open connections and load container metadata ahead of the first request
+        
+        Issues one point read for an item that does not exist, which makes the
+        SDK establish its HTTPS connection(s) and fetch the container's
+        partition routing map, so the first authenticated request does not
+        pay for them. Call once at application startup.
+        """
+        try:
+            self.container.read_item(
+                item=_ITEM_PREFIX + "__warmup__",
+                partition_key="__warmup__"
+            )
+        except CosmosResourceNotFoundError:
+            pass
     
     def verify_user_exists(self, user_id: str) -> bool:
         """
@@ -36,7 +251,7 @@ class UserVerifier:
         try:
             user = self.get_user(user_id)
             return user is not None
-        except Exception:
+        except CosmosAuthError:
             return False
     
     def get_user(self, user_id: str) -> Optional[User]:
@@ -49,20 +264,107 @@ class UserVerifier:
         Returns:
             User object if found, None otherwise
         """
+        user = self._cache.get(user_id)
+        if user is not _MISSING:
+            return user
+        if self._negative_cache.get(user_id) is not _MISSING:
+            return None
+        
+        # Single-flight: concurrent misses for the same user share one read
+        with self._inflight_lock:
+            flight = self._inflight.get(user_id)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[user_id] = _Flight()
+        
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        
         try:
-            item_id = f"user_{user_id}"
-            item = self.container.read_item(
+            flight.result = self._read_user(user_id)
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[user_id]
+            flight.event.set()
+    
+    def _read_user(self, user_id: str) -> Optional[User]:
+        """Point-read a user from Cosmos DB and record the result in the caches"""
+        token = self._cache.snapshot()
+        negative_token = self._negative_cache.snapshot()
+        try:
+            item_id = _ITEM_PREFIX + user_id
+            item = self._read_item(
                 item=item_id,
                 partition_key=user_id
             )
             
-            if isinstance(item, CosmosDict):
-                return User.from_dict(dict(item))
-            return User.from_dict(item)
+            user = User.from_dict(item)
+            self._cache.fill(user_id, user, token)
+            return user
         except CosmosResourceNotFoundError:
+            self._negative_cache.fill(user_id, None, negative_token)
             return None
         except Exception as e:
-            raise Exception(f"Error getting user: {str(e)}")
+            raise CosmosAuthError("Error getting user") from e
+    
+    def get_users(self, user_ids: List[str]) -> Dict[str, User]:
+        """
+        Get several users from Cosmos DB with batched point reads
+        
+        Cached users are served from memory; the rest are fetched with
+        ``read_items``, up to 100 IDs per call (a parameterized query on
+        azure-cosmos releases that predate it).
+        
+        Args:
+            user_ids: User IDs (emails) to look up
+            
+        Returns:
+            Dictionary of user_id -> User for every user that was found
+        """
+        users: Dict[str, User] = {}
+        missing: List[str] = []
+        for user_id in dict.fromkeys(user_ids):
+            user = self._cache.get(user_id)
+            if user is not _MISSING:
+                users[user_id] = user
+            elif self._negative_cache.get(user_id) is _MISSING:
+                missing.append(user_id)
+        
+        if not missing:
+            return users
+        
+        token = self._cache.snapshot()
+        negative_token = self._negative_cache.snapshot()
+        read_items = self._read_items
+        for start in range(0, len(missing), _USERS_BATCH_SIZE):
+            chunk = missing[start:start + _USERS_BATCH_SIZE]
+            if read_items is not None:
+                items = read_items(
+                    items=[(_ITEM_PREFIX + user_id, user_id) for user_id in chunk]
+                )
+            else:
+                # azure-cosmos releases without read_items: one query per chunk
+                items = self._query_items(
+                    query=_USERS_BY_ID_QUERY,
+                    parameters=[{"name": "@ids", "value": chunk}],
+                    enable_cross_partition_query=True
+                )
+            for item in items:
+                user = User.from_dict(item)
+                self._cache.fill(user.user_id, user, token)
+                users[user.user_id] = user
+        for user_id in missing:
+            if user_id not in users:
+                self._negative_cache.fill(user_id, None, negative_token)
+        
+        return users
     
     def get_user_by_email(self, email: str) -> Optional[User]:
         """
@@ -86,20 +388,121 @@ class UserVerifier:
         Returns:
             User object if found, None otherwise
         """
-        # Query by username
-        query = "SELECT * FROM c WHERE c.username = @username AND c.type = 'user'"
+        if self._negative_username_cache.get(username) is not _MISSING:
+            return None
+        token = self._negative_username_cache.snapshot()
+        
+        # Point read on the username index document, then on the user itself
+        try:
+            index = self._read_item(
+                item=_USERNAME_INDEX_PREFIX + username,
+                partition_key=username
+            )
+        except CosmosResourceNotFoundError:
+            user = self._query_user_by_username(username)
+        else:
+            user = self.get_user(index["target_user_id"])
+            if user is not None and user.username != username:
+                # Stale index entry left behind by a username change
+                user = None
+        
+        if user is None:
+            self._negative_username_cache.fill(username, None, token)
+        return user
+    
+    def _query_user_by_username(self, username: str) -> Optional[User]:
+        """
+        Fall back to a query for users created before the username index
+        existed, backfilling the index so the next lookup is a point read
+        """
         parameters = [{"name": "@username", "value": username}]
+        token = self._cache.snapshot()
         
-        items = self.container.query_items(
-            query=query,
+        # A single match is all we need: TOP 1 caps the work per partition
+        # and max_item_count=1 keeps each page to one document
+        item = next(iter(self._query_items(
+            query=_USERNAME_QUERY,
             parameters=parameters,
-            enable_cross_partition_query=True
-        )
+            enable_cross_partition_query=True,
+            max_item_count=1
+        )), None)
+        if item is None:
+            return None
+        
+        user = User.from_dict(item)
+        self._claim_username(user.username, user.user_id)
+        self._negative_cache.pop(user.user_id)
+        self._cache.fill(user.user_id, user, token)
+        return user
+    
+    def _claim_username(self, username: str, user_id: str) -> bool:
+        """
+        Point the username index document at user_id unless another user owns it
         
-        for item in items:
-            return User.from_dict(dict(item))
+        The index document lives in the username's logical partition so
+        get_user_by_username can resolve it with a point read. It is written
+        with create_item, so an existing entry is never silently overwritten;
+        an entry is only taken over (guarded by its etag) when the user it
+        points at no longer has that username.
+        
+        Returns:
+            True if the index now points at user_id, False if the username
+            belongs to someone else
+        """
+        self._negative_username_cache.pop(username)
+        index_id = _USERNAME_INDEX_PREFIX + username
+        try:
+            self._create_item(_username_index_dict(username, user_id))
+            return True
+        except CosmosResourceExistsError:
+            pass
+        
+        try:
+            index = self._read_item(item=index_id, partition_key=username)
+        except CosmosResourceNotFoundError:
+            return False
+        owner_id = index["target_user_id"]
+        if owner_id == user_id:
+            return True
+        owner = self._read_user(owner_id)
+        if owner is not None and owner.username == username:
+            return False
+        
+        try:
+            self._replace_item(
+                item=index_id,
+                body=_username_index_dict(username, user_id),
+                etag=index["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+            return True
+        except CosmosAccessConditionFailedError:
+            return False
+    
+    def _release_username(self, username: str, user_id: str) -> None:
+        """
+        Delete the username index document if it still points at user_id
         
-        return None
+        Another user may have taken the username over since, so the entry
+        is read first and only deleted (guarded by its etag) while user_id
+        owns it.
+        """
+        index_id = _USERNAME_INDEX_PREFIX + username
+        try:
+            index = self._read_item(item=index_id, partition_key=username)
+        except CosmosResourceNotFoundError:
+            return
+        if index.get("target_user_id") != user_id:
+            return
+        try:
+            self.container.delete_item(
+                item=index_id,
+                partition_key=username,
+                etag=index["_etag"],
+                match_condition=MatchConditions.IfNotModified
+            )
+        except (CosmosResourceNotFoundError, CosmosAccessConditionFailedError):
+            pass
     
     def create_user(
         self,
@@ -112,6 +515,12 @@ class UserVerifier:
         """
         Create a new user in Cosmos DB
         
+        An explicitly requested username that already belongs to another
+        user is refused. When the username is defaulted from the email
+        prefix and already taken (alice@a.com / alice@b.com), the user is
+        still created but get_user_by_username keeps resolving to the
+        existing owner.
+        
         Args:
             email: User email (used as user_id)
             username: Username (defaults to email prefix)
@@ -121,6 +530,9 @@ class UserVerifier:
             
         Returns:
             Created User object
+        
+        Raises:
+            ValueError: If username is already taken by another user
         """
         user = User(
             user_id=email,
@@ -131,8 +543,13 @@ class UserVerifier:
             **kwargs
         )
         
+        if not self._claim_username(user.username, email) and username is not None:
+            raise ValueError(f"Username '{username}' is already taken")
+        
         user_dict = user.to_dict()
-        self.container.upsert_item(user_dict)
+        self._upsert_item(user_dict)
+        self._negative_cache.pop(email)
+        self._cache.set(email, user)
         
         return user
     
@@ -194,16 +611,65 @@ class UserVerifier:
         Returns:
             True if updated successfully
         """
+        return self.update_user_profile(user_id, role=new_role)
+    
+    def update_user_profile(
+        self,
+        user_id: str,
+        *,
+        role: Optional[str] = None,
+        display_name: Optional[str] = None,
+        username: Optional[str] = None,
+    ) -> bool:
+        """
+        Update several user fields in a single atomic patch
+        
+        All field changes go into one ``patch_item`` call, which Cosmos DB
+        applies atomically. A username change also moves the username index
+        document: the new entry is written before the user is patched and the
+        old one is removed afterwards, so the user stays resolvable by
+        username at every step (stale entries are ignored on lookup).
+        
+        Args:
+            user_id: User ID
+            role: New role
+            display_name: New display name
+            username: New username (must not belong to another user)
+            
+        Returns:
+            True if updated successfully
+        """
+        patch_operations = _profile_patch_operations(role, display_name, username)
+        if not patch_operations:
+            return True
+        
         try:
-            item_id = f"user_{user_id}"
-            patch_operations = [{'op': 'set', 'path': '/role', 'value': new_role}]
+            old_username = None
+            if username is not None:
+                current = self._read_user(user_id)
+                if current is None:
+                    return False
+                if current.username != username:
+                    if not self._claim_username(username, user_id):
+                        return False
+                    old_username = current.username
             
-            self.container.patch_item(
+            item_id = _ITEM_PREFIX + user_id
+            item = self._patch_item(
                 item=item_id,
                 partition_key=user_id,
                 patch_operations=patch_operations
             )
-            return True
+            self._negative_cache.pop(user_id)
+            self._cache.set(user_id, User.from_dict(item))
         except Exception:
+            self.invalidate(user_id)
             return False
-
+        
+        if old_username:
+            try:
+                self._release_username(old_username, user_id)
+            except Exception:
+                # Left behind, it is harmless: lookups reject stale entries
+                pass
+        return True
@@ -41,7 +41,8 @@ setup(
     extras_require={
         "flask": ["flask>=2.0.0"],
         "fastapi": ["fastapi>=0.100.0"],
-        "all": ["flask>=2.0.0", "fastapi>=0.100.0"],
+        "async": ["aiohttp>=3.8.0"],
+        "all": ["flask>=2.0.0", "fastapi>=0.100.0", "aiohttp>=3.8.0"],
     },
     keywords="cosmos db, azure, authentication, user verification, flask, fastapi, auth",
     project_urls={
@@ -0,0 +1,209 @@
+"""
+Shared fixtures: in-memory stand-ins for the Cosmos DB container proxies
+"""
+
+import asyncio
+import itertools
+import threading
+from typing import Optional
+
+import pytest
+from azure.core import MatchConditions
+from azure.cosmos.exceptions import (
+    CosmosAccessConditionFailedError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
+
+import cosmos_auth_package.user_verifier as user_verifier_module
+
+
+def user_item(user_id: str, role: str = "user", username: Optional[str] = None) -> dict:
+    """Build a user document as stored in Cosmos DB"""
+    return {
+        "id": "user_" + user_id,
+        "type": "user",
+        "user_id": user_id,
+        "email": user_id,
+        "username": username or user_id.split("@")[0],
+        "role": role,
+        "display_name": user_id,
+        "is_active": True,
+        "agents": [],
+    }
+
+
+class FakeContainer:
+    """
+    In-memory stand-in for azure.cosmos.ContainerProxy
+    
+    Items are keyed by (id, partition key) and carry an ``_etag`` that
+    changes on every write. Counts point reads, logs every call in ``ops``,
+    can hold reads on a gate to keep them in flight, and raises ``fail``
+    (when set) instead of answering a read.
+    """
+    
+    def __init__(self):
+        self.items = {}
+        self.reads = 0
+        self.batches = []
+        self.ops = []
+        self.fail = None
+        self.gate = None
+        self.reading = threading.Event()
+        self._lock = threading.Lock()
+        self._etags = itertools.count(1)
+    
+    def _put(self, body: dict) -> dict:
+        item = dict(body, _etag=str(next(self._etags)))
+        self.items[(item["id"], item["user_id"])] = item
+        return dict(item)
+    
+    def _get(self, item: str, partition_key: str) -> dict:
+        try:
+            return self.items[(item, partition_key)]
+        except KeyError:
+            raise CosmosResourceNotFoundError(message=item) from None
+    
+    def _check_etag(self, current: dict, etag, match_condition) -> None:
+        if match_condition is MatchConditions.IfNotModified and current["_etag"] != etag:
+            raise CosmosAccessConditionFailedError(message=current["id"])
+    
+    def add(self, user_id: str, **kwargs) -> dict:
+        """Store a user document directly, with no username index entry"""
+        return self._put(user_item(user_id, **kwargs))
+    
+    def _answer(self, item: str, partition_key: str) -> dict:
+        if self.fail is not None:
+            raise self.fail
+        return dict(self._get(item, partition_key))
+    
+    def read_item(self, item: str, partition_key: str, **kwargs) -> dict:
+        with self._lock:
+            self.reads += 1
+        self.ops.append(("read", item))
+        # Resolve the answer before parking so a test can change the stored
+        # item while this (now stale) read is still in flight
+        try:
+            answer = self._answer(item, partition_key)
+        except Exception as e:
+            answer = e
+        self.reading.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    
+    def read_items(self, items: list, **kwargs) -> list:
+        self.batches.append([item for item, _ in items])
+        return [dict(self.items[key]) for key in items if key in self.items]
+    
+    def query_items(self, query: str, parameters: list, **kwargs):
+        self.ops.append(("query", query))
+        values = {parameter["name"]: parameter["value"] for parameter in parameters}
+        return iter([
+            dict(item) for item in self.items.values()
+            if item["type"] == "user" and item["username"] == values.get("@username")
+        ])
+    
+    def create_item(self, body: dict, **kwargs) -> dict:
+        self.ops.append(("create", body["id"]))
+        if (body["id"], body["user_id"]) in self.items:
+            raise CosmosResourceExistsError(message=body["id"])
+        return self._put(body)
+    
+    def upsert_item(self, body: dict, **kwargs) -> dict:
+        self.ops.append(("upsert", body["id"]))
+        return self._put(body)
+    
+    def replace_item(self, item: str, body: dict, etag=None, match_condition=None, **kwargs) -> dict:
+        self.ops.append(("replace", item))
+        self._check_etag(self._get(item, body["user_id"]), etag, match_condition)
+        return self._put(body)
+    
+    def patch_item(self, item: str, partition_key: str, patch_operations: list, **kwargs) -> dict:
+        self.ops.append(("patch", item))
+        patched = dict(self._get(item, partition_key))
+        for operation in patch_operations:
+            patched[operation["path"].lstrip("/")] = operation["value"]
+        return self._put(patched)
+    
+    def delete_item(self, item: str, partition_key: str, etag=None, match_condition=None, **kwargs) -> None:
+        self.ops.append(("delete", item))
+        self._check_etag(self._get(item, partition_key), etag, match_condition)
+        del self.items[(item, partition_key)]
+
+
+class AsyncFakeContainer(FakeContainer):
+    """Stand-in for azure.cosmos.aio.ContainerProxy; gate is an asyncio.Event"""
+    
+    async def read_item(self, item: str, partition_key: str, **kwargs) -> dict:
+        self.reads += 1
+        self.ops.append(("read", item))
+        try:
+            answer = self._answer(item, partition_key)
+        except Exception as e:
+            answer = e
+        self.reading.set()
+        if self.gate is not None:
+            await asyncio.wait_for(self.gate.wait(), 5)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    
+    async def read_items(self, *args, **kwargs) -> list:
+        return FakeContainer.read_items(self, *args, **kwargs)
+    
+    def query_items(self, *args, **kwargs):
+        items = FakeContainer.query_items(self, *args, **kwargs)
+        
+        async def pages():
+            for item in items:
+                yield item
+        return pages()
+    
+    async def create_item(self, *args, **kwargs) -> dict:
+        return FakeContainer.create_item(self, *args, **kwargs)
+    
+    async def upsert_item(self, *args, **kwargs) -> dict:
+        return FakeContainer.upsert_item(self, *args, **kwargs)
+    
+    async def replace_item(self, *args, **kwargs) -> dict:
+        return FakeContainer.replace_item(self, *args, **kwargs)
+    
+    async def patch_item(self, *args, **kwargs) -> dict:
+        return FakeContainer.patch_item(self, *args, **kwargs)
+    
+    async def delete_item(self, *args, **kwargs) -> None:
+        return FakeContainer.delete_item(self, *args, **kwargs)
+
+
+class FakeClock:
+    """Replaces time.monotonic for the verifier caches"""
+    
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self) -> float:
+        return self.now
+    
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def container():
+    return FakeContainer()
+
+
+@pytest.fixture
+def async_container():
+    return AsyncFakeContainer()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(user_verifier_module, "time", fake)
+    return fake
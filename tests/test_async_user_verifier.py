@@ -0,0 +1,278 @@
+"""
+Tests for AsyncUserVerifier caching and single-flight reads
+"""
+
+import asyncio
+
+import pytest
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from cosmos_auth_package import AsyncUserVerifier, CosmosAuthError
+
+
+async def _start_flight(verifier, container, user_id: str, followers: int):
+    """Start a leader, wait until its read is in flight, then add followers"""
+    container.gate = asyncio.Event()
+    leader = asyncio.ensure_future(verifier.get_user(user_id))
+    while not container.reading.is_set():
+        await asyncio.sleep(0)
+    tasks = [asyncio.ensure_future(verifier.get_user(user_id)) for _ in range(followers)]
+    await asyncio.sleep(0)
+    return leader, tasks
+
+
+def test_concurrent_misses_share_one_read(async_container):
+    async_container.add("alice@example.com")
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        leader, tasks = await _start_flight(verifier, async_container, "alice@example.com", 7)
+        async_container.gate.set()
+        return await asyncio.gather(leader, *tasks)
+    
+    results = asyncio.run(scenario())
+    
+    assert async_container.reads == 1
+    assert all(user is results[0] for user in results)
+    assert not verifier._inflight
+
+
+def test_read_error_reaches_every_caller_and_is_not_cached(async_container):
+    async_container.add("alice@example.com")
+    async_container.fail = CosmosHttpResponseError(status_code=503, message="unavailable")
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        leader, tasks = await _start_flight(verifier, async_container, "alice@example.com", 3)
+        async_container.gate.set()
+        results = await asyncio.gather(leader, *tasks, return_exceptions=True)
+        async_container.fail = None
+        return results, await verifier.get_user("alice@example.com")
+    
+    results, retried = asyncio.run(scenario())
+    
+    assert all(isinstance(error, CosmosAuthError) for error in results)
+    assert async_container.reads == 2
+    assert retried.user_id == "alice@example.com"
+    assert not verifier._inflight
+
+
+def test_cancelled_leader_does_not_cancel_followers(async_container):
+    async_container.add("alice@example.com")
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        leader, tasks = await _start_flight(verifier, async_container, "alice@example.com", 3)
+        leader.cancel()
+        await asyncio.sleep(0)
+        async_container.gate.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*tasks)
+    
+    results = asyncio.run(scenario())
+    
+    assert [user.user_id for user in results] == ["alice@example.com"] * 3
+    assert async_container.reads == 1
+    assert not verifier._inflight
+
+
+def test_read_outlives_every_cancelled_caller(async_container):
+    async_container.add("alice@example.com")
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        leader, tasks = await _start_flight(verifier, async_container, "alice@example.com", 0)
+        leader.cancel()
+        async_container.gate.set()
+        while verifier._inflight:
+            await asyncio.sleep(0)
+        return await verifier.get_user("alice@example.com")
+    
+    user = asyncio.run(scenario())
+    
+    assert user.user_id == "alice@example.com"
+    assert async_container.reads == 1
+
+
+def test_invalidate_during_read_is_not_overwritten(async_container):
+    async_container.add("alice@example.com", role="admin")
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        leader, _ = await _start_flight(verifier, async_container, "alice@example.com", 0)
+        # Role revoked while the read (which saw "admin") is still in flight
+        async_container.add("alice@example.com", role="user")
+        verifier.invalidate("alice@example.com")
+        async_container.gate.set()
+        await leader
+        return await verifier.get_user("alice@example.com")
+    
+    assert asyncio.run(scenario()).role == "user"
+    assert async_container.reads == 2
+
+
+def test_unknown_user_is_negative_cached(async_container, clock):
+    verifier = AsyncUserVerifier(async_container, negative_cache_ttl=5.0)
+    
+    async def lookup():
+        return await verifier.get_user("bob@example.com")
+    
+    assert asyncio.run(lookup()) is None
+    assert asyncio.run(lookup()) is None
+    assert async_container.reads == 1
+    
+    async_container.add("bob@example.com")
+    clock.advance(6)
+    assert asyncio.run(lookup()).user_id == "bob@example.com"
+    assert async_container.reads == 2
+
+
+def test_cached_user_expires_after_ttl(async_container, clock):
+    async_container.add("alice@example.com")
+    verifier = AsyncUserVerifier(async_container, cache_ttl=30.0)
+    
+    async def lookup():
+        return await verifier.get_user("alice@example.com")
+    
+    first = asyncio.run(lookup())
+    clock.advance(29)
+    assert asyncio.run(lookup()) is first
+    clock.advance(2)
+    assert asyncio.run(lookup()) is not first
+    assert async_container.reads == 2
+
+
+def test_get_users_batches_uncached_ids(async_container):
+    user_ids = [f"user{i}@example.com" for i in range(150)]
+    for user_id in user_ids:
+        async_container.add(user_id)
+    verifier = AsyncUserVerifier(async_container)
+    
+    users = asyncio.run(verifier.get_users(user_ids + ["nobody@example.com"]))
+    
+    assert set(users) == set(user_ids)
+    assert [len(batch) for batch in async_container.batches] == [100, 51]
+
+
+def _index(container, username: str) -> dict:
+    return container.items.get(("username_" + username, username))
+
+
+def test_default_username_collision_keeps_first_owner(async_container):
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        await verifier.create_user("alice@a.com")
+        await verifier.create_user("alice@b.com")
+        return await verifier.get_user_by_username("alice")
+    
+    assert asyncio.run(scenario()).user_id == "alice@a.com"
+    assert ("user_alice@b.com", "alice@b.com") in async_container.items
+    assert _index(async_container, "alice")["target_user_id"] == "alice@a.com"
+
+
+def test_explicit_username_already_taken(async_container):
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        await verifier.create_user("alice@a.com", username="alice")
+        with pytest.raises(ValueError):
+            await verifier.create_user("bob@b.com", username="alice")
+    
+    asyncio.run(scenario())
+    assert ("user_bob@b.com", "bob@b.com") not in async_container.items
+
+
+def test_rename_moves_username_lookup(async_container):
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        await verifier.create_user("alice@a.com")
+        assert await verifier.update_user_profile("alice@a.com", username="alicia")
+        return (
+            await verifier.get_user_by_username("alicia"),
+            await verifier.get_user_by_username("alice"),
+        )
+    
+    new, old = asyncio.run(scenario())
+    assert new.user_id == "alice@a.com"
+    assert old is None
+    assert _index(async_container, "alice") is None
+
+
+def test_legacy_user_is_found_by_query_and_backfilled(async_container):
+    async_container.add("carol@c.com")
+    verifier = AsyncUserVerifier(async_container)
+    
+    user = asyncio.run(verifier.get_user_by_username("carol"))
+    
+    assert user.user_id == "carol@c.com"
+    assert _index(async_container, "carol")["target_user_id"] == "carol@c.com"
+
+
+def test_unknown_username_is_negative_cached(async_container):
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        return [await verifier.get_user_by_username("nobody") for _ in range(3)]
+    
+    assert asyncio.run(scenario()) == [None, None, None]
+    assert [op for op, _ in async_container.ops] == ["read", "query"]
+
+
+def test_rename_claims_then_patches_then_releases(async_container):
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        await verifier.create_user("alice@a.com")
+        async_container.ops.clear()
+        return await verifier.update_user_profile("alice@a.com", username="alicia")
+    
+    assert asyncio.run(scenario())
+    writes = [op for op in async_container.ops if op[0] != "read"]
+    assert writes == [
+        ("create", "username_alicia"),
+        ("patch", "user_alice@a.com"),
+        ("delete", "username_alice"),
+    ]
+
+
+def test_update_profile_refuses_taken_username(async_container):
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        await verifier.create_user("alice@a.com")
+        await verifier.create_user("bob@b.com")
+        return await verifier.update_user_profile("bob@b.com", username="alice")
+    
+    assert not asyncio.run(scenario())
+    assert async_container.items[("user_bob@b.com", "bob@b.com")]["username"] == "bob"
+    assert _index(async_container, "alice")["target_user_id"] == "alice@a.com"
+
+
+def test_update_profile_unknown_user(async_container):
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        return (
+            await verifier.update_user_profile("ghost@g.com", username="ghost"),
+            await verifier.update_user_role("ghost@g.com", "admin"),
+        )
+    
+    assert asyncio.run(scenario()) == (False, False)
+
+
+def test_update_profile_writes_patched_user_through_cache(async_container):
+    verifier = AsyncUserVerifier(async_container)
+    
+    async def scenario():
+        await verifier.create_user("alice@a.com")
+        reads = async_container.reads
+        assert await verifier.update_user_profile("alice@a.com", role="admin")
+        user = await verifier.get_user("alice@a.com")
+        return user, async_container.reads - reads
+    
+    user, reads = asyncio.run(scenario())
+    assert user.role == "admin"
+    assert reads == 0
@@ -0,0 +1,213 @@
+"""
+Tests for the Flask and FastAPI integrations
+"""
+
+import pytest
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from cosmos_auth_package import UserVerifier, User
+
+
+@pytest.fixture
+def verifier(container):
+    verifier = UserVerifier(container)
+    verifier.create_user("alice@a.com")
+    verifier.create_user("root@a.com", role="admin")
+    verifier.invalidate()
+    container.reads = 0
+    return verifier
+
+
+@pytest.fixture
+def asgi_client(verifier):
+    pytest.importorskip("fastapi")
+    testclient = pytest.importorskip("fastapi.testclient")
+    from fastapi import Depends, FastAPI
+    from cosmos_auth_package import CosmosAuthASGIMiddleware, get_current_user_asgi
+    
+    app = FastAPI()
+    app.add_middleware(CosmosAuthASGIMiddleware, verifier=verifier)
+    
+    @app.get("/public")
+    async def public():
+        return {}
+    
+    @app.get("/me")
+    async def me(user: User = Depends(get_current_user_asgi())):
+        return {"user_id": user.user_id}
+    
+    @app.get("/admin")
+    async def admin(user: User = Depends(get_current_user_asgi(["admin"]))):
+        return {"user_id": user.user_id}
+    
+    return testclient.TestClient(app)
+
+
+def test_asgi_public_route_never_reads(asgi_client, container):
+    container.fail = CosmosHttpResponseError(status_code=503, message="unavailable")
+    
+    response = asgi_client.get("/public", headers={"x-user-email": "alice@a.com"})
+    
+    assert response.status_code == 200
+    assert container.reads == 0
+
+
+@pytest.mark.parametrize("headers", [
+    {"x-user-email": "alice@a.com"},
+    {"x-user-id": "alice@a.com"},
+    {"Authorization": "Bearer alice@a.com"},
+    {"x-user-email": "", "x-user-id": "alice@a.com"},
+    {"x-user-email": "", "Authorization": "Bearer alice@a.com"},
+])
+def test_asgi_identifier_headers(asgi_client, headers):
+    response = asgi_client.get("/me", headers=headers)
+    
+    assert response.status_code == 200
+    assert response.json() == {"user_id": "alice@a.com"}
+
+
+def test_asgi_error_statuses(asgi_client, container):
+    assert asgi_client.get("/me").status_code == 401
+    assert asgi_client.get("/me", headers={"x-user-email": ""}).status_code == 401
+    assert asgi_client.get("/me", headers={"x-user-email": "ghost@g.com"}).status_code == 401
+    assert asgi_client.get("/admin", headers={"x-user-email": "alice@a.com"}).status_code == 403
+    assert asgi_client.get("/admin", headers={"x-user-email": "root@a.com"}).status_code == 200
+    
+    container.fail = CosmosHttpResponseError(status_code=503, message="unavailable")
+    assert asgi_client.get("/me", headers={"x-user-email": "bob@b.com"}).status_code == 503
+
+
+@pytest.fixture
+def flask_app(verifier):
+    flask = pytest.importorskip("flask")
+    from cosmos_auth_package import require_auth
+    
+    app = flask.Flask(__name__)
+    
+    def who():
+        return flask.jsonify({"user_id": flask.g.user_id, "role": flask.g.user_role})
+    
+    # Each route gets a distinct generated wrapper; Flask would refuse to
+    # register them if they all reported the same endpoint name
+    for rule, kwargs in {
+        "/me": {},
+        "/admin": {"required_roles": ["admin"]},
+        "/signup": {"auto_create": True},
+        "/by-id": {"header_name": "x-user-id"},
+        "/by-token": {"header_name": "Authorization"},
+    }.items():
+        view = require_auth(verifier, **kwargs)(who)
+        app.add_url_rule(rule, endpoint=rule, view_func=view)
+    
+    @app.route("/named")
+    @require_auth(verifier)
+    def named_view():
+        """Docstring kept by functools.wraps"""
+        return who()
+    
+    app.named_view = named_view
+    return app
+
+
+@pytest.mark.parametrize("headers", [
+    {"x-user-email": "alice@a.com"},
+    {"x-user-id": "alice@a.com"},
+    {"Authorization": "Bearer alice@a.com"},
+    {"Authorization": "alice@a.com"},
+    {"x-user-email": "", "x-user-id": "alice@a.com"},
+])
+def test_flask_identifier_headers(flask_app, headers):
+    response = flask_app.test_client().get("/me", headers=headers)
+    
+    assert response.status_code == 200
+    assert response.get_json() == {"user_id": "alice@a.com", "role": "user"}
+
+
+def test_flask_missing_or_unknown_user(flask_app, container):
+    client = flask_app.test_client()
+    
+    assert client.get("/me").status_code == 401
+    assert client.get("/me", headers={"x-user-email": "ghost@g.com"}).status_code == 401
+    assert ("user_ghost@g.com", "ghost@g.com") not in container.items
+
+
+def test_flask_roles(flask_app):
+    client = flask_app.test_client()
+    
+    assert client.get("/admin", headers={"x-user-email": "alice@a.com"}).status_code == 403
+    assert client.get("/admin", headers={"x-user-email": "root@a.com"}).status_code == 200
+
+
+def test_flask_auto_create(flask_app, container):
+    response = flask_app.test_client().get("/signup", headers={"x-user-email": "new@n.com"})
+    
+    assert response.status_code == 200
+    assert response.get_json() == {"user_id": "new@n.com", "role": "user"}
+    assert ("user_new@n.com", "new@n.com") in container.items
+
+
+@pytest.mark.parametrize("rule, headers", [
+    ("/by-id", {"x-user-id": "alice@a.com"}),
+    ("/by-id", {"Authorization": "Bearer alice@a.com"}),
+    ("/by-id", {"x-user-id": "", "Authorization": "alice@a.com"}),
+    ("/by-token", {"Authorization": "Bearer alice@a.com"}),
+    ("/by-token", {"x-user-id": "alice@a.com"}),
+])
+def test_flask_custom_header_name(flask_app, rule, headers):
+    response = flask_app.test_client().get(rule, headers=headers)
+    
+    assert response.status_code == 200
+    assert response.get_json()["user_id"] == "alice@a.com"
+
+
+@pytest.mark.parametrize("rule", ["/by-id", "/by-token"])
+def test_flask_custom_header_name_replaces_default(flask_app, rule):
+    response = flask_app.test_client().get(rule, headers={"x-user-email": "alice@a.com"})
+    
+    assert response.status_code == 401
+
+
+def test_flask_wrapper_keeps_view_identity(flask_app):
+    view = flask_app.named_view
+    
+    assert view.__name__ == "named_view"
+    assert view.__doc__ == "Docstring kept by functools.wraps"
+    assert view.__wrapped__.__name__ == "named_view"
+    assert "named_view" in flask_app.view_functions
+
+
+def test_flask_wrapper_source_shows_in_tracebacks(flask_app, container):
+    import linecache
+    import traceback
+    
+    container.fail = RuntimeError("boom")
+    flask_app.testing = True
+    with pytest.raises(Exception) as info:
+        flask_app.test_client().get("/me", headers={"x-user-email": "bob@b.com"})
+    
+    frame = next(
+        entry for entry in traceback.extract_tb(info.value.__traceback__)
+        if entry.filename.startswith("<require_auth")
+    )
+    assert frame.line == "user = verifier.get_user(user_identifier)"
+    assert linecache.getline(frame.filename, frame.lineno).strip() == frame.line
+
+
+def test_fastapi_header_dependency_maps_lookup_failure_to_503(verifier, container):
+    pytest.importorskip("fastapi")
+    testclient = pytest.importorskip("fastapi.testclient")
+    from fastapi import Depends, FastAPI
+    from cosmos_auth_package import get_current_user_fastapi
+    
+    app = FastAPI()
+    
+    @app.get("/me")
+    async def me(user: User = Depends(get_current_user_fastapi(verifier))):
+        return {"user_id": user.user_id}
+    
+    client = testclient.TestClient(app)
+    assert client.get("/me", headers={"x-user-email": "alice@a.com"}).status_code == 200
+    assert client.get("/me", headers={"x-user-email": "ghost@g.com"}).status_code == 401
+    
+    container.fail = CosmosHttpResponseError(status_code=503, message="unavailable")
+    assert client.get("/me", headers={"x-user-email": "bob@b.com"}).status_code == 503
@@ -0,0 +1,301 @@
+"""
+Tests for UserVerifier caching and single-flight reads
+"""
+
+import threading
+import time
+
+import pytest
+from azure.cosmos.exceptions import CosmosHttpResponseError
+
+from cosmos_auth_package import UserVerifier, CosmosAuthError
+
+
+def _run_concurrently(target, count: int, container) -> list:
+    """Start one get_user leader, let it reach Cosmos DB, then pile on"""
+    results = [None] * count
+    
+    def call(index):
+        try:
+            results[index] = target()
+        except Exception as e:
+            results[index] = e
+    
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    threads[0].start()
+    assert container.reading.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # Give the followers time to park on the in-flight read
+    time.sleep(0.05)
+    container.gate.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_misses_share_one_read(container):
+    container.add("alice@example.com")
+    container.gate = threading.Event()
+    verifier = UserVerifier(container)
+    
+    results = _run_concurrently(lambda: verifier.get_user("alice@example.com"), 8, container)
+    
+    assert container.reads == 1
+    assert all(user is results[0] for user in results)
+    assert results[0].user_id == "alice@example.com"
+    assert not verifier._inflight
+
+
+def test_read_error_reaches_every_caller_and_is_not_cached(container):
+    container.add("alice@example.com")
+    container.fail = CosmosHttpResponseError(status_code=503, message="unavailable")
+    container.gate = threading.Event()
+    verifier = UserVerifier(container)
+    
+    results = _run_concurrently(lambda: verifier.get_user("alice@example.com"), 4, container)
+    
+    assert all(isinstance(error, CosmosAuthError) for error in results)
+    assert isinstance(results[0].__cause__, CosmosHttpResponseError)
+    assert not verifier._inflight
+    
+    container.fail = None
+    reads = container.reads
+    assert verifier.get_user("alice@example.com").user_id == "alice@example.com"
+    assert container.reads == reads + 1
+
+
+def test_invalidate_during_read_is_not_overwritten(container):
+    container.add("alice@example.com", role="admin")
+    container.gate = threading.Event()
+    verifier = UserVerifier(container)
+    
+    thread = threading.Thread(target=verifier.get_user, args=("alice@example.com",))
+    thread.start()
+    assert container.reading.wait(5)
+    # Role revoked while the read (which saw "admin") is still in flight
+    container.add("alice@example.com", role="user")
+    verifier.invalidate("alice@example.com")
+    container.gate.set()
+    thread.join(5)
+    
+    assert verifier.get_user("alice@example.com").role == "user"
+    assert container.reads == 2
+
+
+def test_cached_user_expires_after_ttl(container, clock):
+    container.add("alice@example.com")
+    verifier = UserVerifier(container, cache_ttl=30.0)
+    
+    first = verifier.get_user("alice@example.com")
+    clock.advance(29)
+    assert verifier.get_user("alice@example.com") is first
+    assert container.reads == 1
+    
+    clock.advance(2)
+    assert verifier.get_user("alice@example.com") is not first
+    assert container.reads == 2
+
+
+def test_unknown_user_is_negative_cached(container, clock):
+    verifier = UserVerifier(container, negative_cache_ttl=5.0)
+    
+    assert verifier.get_user("bob@example.com") is None
+    assert verifier.get_user("bob@example.com") is None
+    assert container.reads == 1
+    
+    container.add("bob@example.com")
+    clock.advance(6)
+    assert verifier.get_user("bob@example.com").user_id == "bob@example.com"
+    assert container.reads == 2
+
+
+def test_invalidate_drops_negative_entry(container):
+    verifier = UserVerifier(container)
+    assert verifier.get_user("bob@example.com") is None
+    
+    container.add("bob@example.com")
+    verifier.invalidate("bob@example.com")
+    
+    assert verifier.get_user("bob@example.com").user_id == "bob@example.com"
+
+
+def test_zero_ttl_disables_caching(container):
+    container.add("alice@example.com")
+    verifier = UserVerifier(container, cache_ttl=0)
+    
+    verifier.get_user("alice@example.com")
+    verifier.get_user("alice@example.com")
+    
+    assert container.reads == 2
+
+
+def test_get_users_batches_uncached_ids(container):
+    user_ids = [f"user{i}@example.com" for i in range(150)]
+    for user_id in user_ids:
+        container.add(user_id)
+    verifier = UserVerifier(container)
+    verifier.get_user(user_ids[0])
+    
+    users = verifier.get_users(user_ids + ["nobody@example.com"])
+    
+    assert set(users) == set(user_ids)
+    assert [len(batch) for batch in container.batches] == [100, 50]
+    assert container.batches[0][0] == "user_" + user_ids[1]
+    # Found users and misses are both cached
+    assert verifier.get_users(user_ids + ["nobody@example.com"]).keys() == users.keys()
+    assert len(container.batches) == 2
+
+
+def _index(container, username: str) -> dict:
+    return container.items.get(("username_" + username, username))
+
+
+def test_default_username_collision_keeps_first_owner(container):
+    verifier = UserVerifier(container)
+    
+    verifier.create_user("alice@a.com")
+    second = verifier.create_user("alice@b.com")
+    
+    assert second.username == "alice"
+    assert container.items[("user_alice@b.com", "alice@b.com")]
+    assert _index(container, "alice")["target_user_id"] == "alice@a.com"
+    assert verifier.get_user_by_username("alice").user_id == "alice@a.com"
+
+
+def test_explicit_username_already_taken(container):
+    verifier = UserVerifier(container)
+    verifier.create_user("alice@a.com", username="alice")
+    
+    with pytest.raises(ValueError):
+        verifier.create_user("bob@b.com", username="alice")
+    
+    assert ("user_bob@b.com", "bob@b.com") not in container.items
+    assert verifier.get_user_by_username("alice").user_id == "alice@a.com"
+
+
+def test_rename_moves_username_lookup(container):
+    verifier = UserVerifier(container)
+    verifier.create_user("alice@a.com")
+    
+    assert verifier.update_user_profile("alice@a.com", username="alicia")
+    
+    assert _index(container, "alice") is None
+    assert verifier.get_user_by_username("alicia").user_id == "alice@a.com"
+    assert verifier.get_user_by_username("alice") is None
+    # A fresh verifier (no caches) resolves the same way
+    fresh = UserVerifier(container)
+    assert fresh.get_user_by_username("alicia").user_id == "alice@a.com"
+    assert fresh.get_user_by_username("alice") is None
+
+
+def test_stale_index_entry_is_rejected_and_taken_over(container):
+    verifier = UserVerifier(container)
+    container.add("alice@a.com", username="alicia")
+    container.create_item({
+        "id": "username_alice",
+        "type": "username_index",
+        "user_id": "alice",
+        "username": "alice",
+        "target_user_id": "alice@a.com",
+    })
+    
+    assert verifier.get_user_by_username("alice") is None
+    
+    verifier.create_user("alice@b.com", username="alice")
+    assert _index(container, "alice")["target_user_id"] == "alice@b.com"
+    assert verifier.get_user_by_username("alice").user_id == "alice@b.com"
+
+
+def test_legacy_user_is_found_by_query_and_backfilled(container):
+    container.add("carol@c.com")
+    verifier = UserVerifier(container)
+    
+    assert verifier.get_user_by_username("carol").user_id == "carol@c.com"
+    assert _index(container, "carol")["target_user_id"] == "carol@c.com"
+    
+    container.ops.clear()
+    assert UserVerifier(container).get_user_by_username("carol").user_id == "carol@c.com"
+    assert not [op for op in container.ops if op[0] == "query"]
+
+
+def test_unknown_username_is_negative_cached(container):
+    verifier = UserVerifier(container)
+    
+    assert verifier.get_user_by_username("nobody") is None
+    assert verifier.get_user_by_username("nobody") is None
+    
+    assert [op for op, _ in container.ops] == ["read", "query"]
+    
+    # Claiming the name clears the miss
+    verifier.create_user("nobody@n.com")
+    assert verifier.get_user_by_username("nobody").user_id == "nobody@n.com"
+
+
+def test_rename_claims_then_patches_then_releases(container):
+    verifier = UserVerifier(container)
+    verifier.create_user("alice@a.com")
+    container.ops.clear()
+    
+    assert verifier.update_user_profile("alice@a.com", username="alicia")
+    
+    writes = [op for op in container.ops if op[0] != "read"]
+    assert writes == [
+        ("create", "username_alicia"),
+        ("patch", "user_alice@a.com"),
+        ("delete", "username_alice"),
+    ]
+
+
+def test_rename_keeps_old_index_claimed_by_someone_else(container):
+    verifier = UserVerifier(container)
+    verifier.create_user("alice@a.com")
+    # Another user took "alice" over between the claim and the release
+    container.upsert_item({
+        "id": "username_alice",
+        "type": "username_index",
+        "user_id": "alice",
+        "username": "alice",
+        "target_user_id": "bob@b.com",
+    })
+    
+    assert verifier.update_user_profile("alice@a.com", username="alicia")
+    
+    assert _index(container, "alice")["target_user_id"] == "bob@b.com"
+
+
+def test_update_profile_refuses_taken_username(container):
+    verifier = UserVerifier(container)
+    verifier.create_user("alice@a.com")
+    verifier.create_user("bob@b.com")
+    
+    assert not verifier.update_user_profile("bob@b.com", username="alice", role="admin")
+    
+    stored = container.items[("user_bob@b.com", "bob@b.com")]
+    assert (stored["username"], stored["role"]) == ("bob", "user")
+    assert _index(container, "alice")["target_user_id"] == "alice@a.com"
+    assert _index(container, "bob")["target_user_id"] == "bob@b.com"
+
+
+def test_update_profile_unknown_user(container):
+    verifier = UserVerifier(container)
+    
+    assert not verifier.update_user_profile("ghost@g.com", username="ghost")
+    assert not verifier.update_user_profile("ghost@g.com", display_name="Ghost")
+    assert not verifier.update_user_role("ghost@g.com", "admin")
+    assert _index(container, "ghost") is None
+
+
+def test_update_profile_writes_patched_user_through_cache(container):
+    verifier = UserVerifier(container)
+    verifier.create_user("alice@a.com")
+    verifier.get_user("alice@a.com")
+    reads = container.reads
+    
+    assert verifier.update_user_profile("alice@a.com", role="admin", display_name="Alice")
+    
+    user = verifier.get_user("alice@a.com")
+    assert (user.role, user.display_name) == ("admin", "Alice")
+    assert container.reads == reads
+    assert verifier.update_user_role("alice@a.com", "viewer")
+    assert verifier.get_user("alice@a.com").role == "viewer"